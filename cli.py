@@ -0,0 +1,62 @@
+import sys
+import argparse
+from core.daemon_client import DaemonClient, DaemonError
+
+# Lekki klient - nie importuje PyQt6 ani cryptography, całą pracę robi `main.py --daemon`
+
+def _progress(value):
+    sys.stderr.write(f"\r{value:3d}%")
+    sys.stderr.flush()
+
+def main():
+    parser = argparse.ArgumentParser(description="UnlockEND daemon client")
+    parser.add_argument("--socket", help="Path to the daemon socket")
+    parser.add_argument("--direct-io", action="store_true", help="Use O_DIRECT for this request")
+    parser.add_argument("--quiet", action="store_true", help="Do not print progress")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    sub.add_parser("ping")
+    lock_p = sub.add_parser("lock", help="Lock files/folders, prints one token per path")
+    lock_p.add_argument("paths", nargs="+")
+    unlock_p = sub.add_parser("unlock", help="Unlock a .end file")
+    unlock_p.add_argument("path")
+    unlock_p.add_argument("token")
+    attempts_p = sub.add_parser("attempts", help="Show remaining attempts of .end files")
+    attempts_p.add_argument("paths", nargs="+")
+    args = parser.parse_args()
+
+    on_progress = None if args.quiet else _progress
+    direct_io = True if args.direct_io else None
+    failed = False
+
+    # Jedno połączenie dla wszystkich ścieżek z wywołania
+    with DaemonClient(args.socket) as client:
+        try:
+            if args.command == "ping":
+                print(client.ping())
+            elif args.command == "lock":
+                for path in args.paths:
+                    try:
+                        token = client.lock(path, direct_io, on_progress)
+                        if on_progress: sys.stderr.write("\n")
+                        print(f"{path}\t{token}")
+                    except DaemonError as e:
+                        failed = True
+                        print(f"{path}\tERROR: {e}", file=sys.stderr)
+            elif args.command == "unlock":
+                print(client.unlock(args.path, args.token, direct_io, on_progress))
+            elif args.command == "attempts":
+                for path in args.paths:
+                    print(f"{path}\t{client.attempts(path)}")
+        except (DaemonError, OSError) as e:
+            print(f"ERROR: {e}", file=sys.stderr)
+            # Skrypty ponawiające próby muszą widzieć, ile szans zostało
+            remaining = getattr(e, "remaining", None)
+            if remaining is not None:
+                print(f"Remaining attempts: {remaining}" + (" (file destroyed)" if remaining == 0 else ""),
+                      file=sys.stderr)
+            return 1
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
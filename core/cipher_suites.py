@@ -0,0 +1,205 @@
+import time
+import struct
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from cryptography.hazmat.primitives.poly1305 import Poly1305
+from cryptography.hazmat.backends import default_backend
+from cryptography.exceptions import InvalidTag, InvalidSignature
+
+
+class IntegrityError(ValueError):
+    """Authenticated suite rejected the ciphertext (wrong data or tampering)."""
+
+
+class CipherSuite:
+    """Base suite: 32-byte key, 16-byte nonce field from the crypto header, optional trailing tag.
+
+    Subclasses implement encryptor()/decryptor(), returning contexts with update, update_into and finalize.
+    """
+
+    suite_id = 0
+    name = ""
+    tag_size = 0
+
+    def encryptor(self, key, nonce, aad=b""):
+        raise NotImplementedError
+
+    def decryptor(self, key, nonce, tag=b"", aad=b""):
+        raise NotImplementedError
+
+
+class _StreamSuite(CipherSuite):
+    """Unauthenticated stream cipher; subclasses provide the Cipher via _cipher()."""
+
+    def encryptor(self, key, nonce, aad=b""):
+        # Szyfry bez tagu nie mają czym uwierzytelnić aad
+        return self._cipher(key, nonce).encryptor()
+
+    def decryptor(self, key, nonce, tag=b"", aad=b""):
+        return self._cipher(key, nonce).decryptor()
+
+
+class AesCtrSuite(_StreamSuite):
+    suite_id = 1
+    name = "aes-ctr"
+
+    def _cipher(self, key, nonce):
+        return Cipher(algorithms.AES(key), modes.CTR(nonce), backend=default_backend())
+
+
+class AesGcmSuite(CipherSuite):
+    suite_id = 2
+    name = "aes-gcm"
+    tag_size = 16
+
+    def encryptor(self, key, nonce, aad=b""):
+        cipher = Cipher(algorithms.AES(key), modes.GCM(nonce[:12]), backend=default_backend())
+        return _GcmEncryptContext(self._with_aad(cipher.encryptor(), aad))
+
+    def decryptor(self, key, nonce, tag=b"", aad=b""):
+        cipher = Cipher(algorithms.AES(key), modes.GCM(nonce[:12], tag), backend=default_backend())
+        return _GcmDecryptContext(self._with_aad(cipher.decryptor(), aad))
+
+    def _with_aad(self, ctx, aad):
+        if aad:
+            ctx.authenticate_additional_data(aad)
+        return ctx
+
+
+class ChaCha20Suite(_StreamSuite):
+    suite_id = 3
+    name = "chacha20"
+
+    def _cipher(self, key, nonce):
+        # Pole nonce (16b) = licznik(4b) + nonce(12b), dokładnie jak oczekuje ChaCha20
+        return Cipher(algorithms.ChaCha20(key, nonce), mode=None, backend=default_backend())
+
+
+class ChaCha20Poly1305Suite(CipherSuite):
+    """Streaming RFC 8439 AEAD built from ChaCha20 + Poly1305 (the AEAD API is one-shot only)."""
+
+    suite_id = 4
+    name = "chacha20-poly1305"
+    tag_size = 16
+
+    def _contexts(self, key, nonce):
+        nonce12 = nonce[4:]
+        otk_cipher = Cipher(algorithms.ChaCha20(key, bytes(4) + nonce12), mode=None, backend=default_backend())
+        one_time_key = otk_cipher.encryptor().update(bytes(32))
+        cipher = Cipher(algorithms.ChaCha20(key, struct.pack("<I", 1) + nonce12), mode=None, backend=default_backend())
+        return cipher, Poly1305(one_time_key)
+
+    def encryptor(self, key, nonce, aad=b""):
+        cipher, mac = self._contexts(key, nonce)
+        return _Poly1305Context(cipher.encryptor(), mac, aad, encrypting=True)
+
+    def decryptor(self, key, nonce, tag=b"", aad=b""):
+        cipher, mac = self._contexts(key, nonce)
+        return _Poly1305Context(cipher.decryptor(), mac, aad, encrypting=False, tag=tag)
+
+
+class _GcmEncryptContext:
+    def __init__(self, ctx):
+        self.ctx = ctx
+
+    def update(self, data):
+        return self.ctx.update(data)
+
+    def update_into(self, data, buf):
+        return self.ctx.update_into(data, buf)
+
+    def finalize(self):
+        # Tag trafia na koniec pliku
+        return self.ctx.finalize() + self.ctx.tag
+
+
+class _GcmDecryptContext(_GcmEncryptContext):
+    def finalize(self):
+        try:
+            return self.ctx.finalize()
+        except InvalidTag:
+            raise IntegrityError("INTEGRITY CHECK FAILED: file was modified or token is wrong.")
+
+
+class _Poly1305Context:
+    def __init__(self, ctx, mac, aad, encrypting, tag=b""):
+        self.ctx = ctx
+        self.mac = mac
+        self.encrypting = encrypting
+        self.tag = tag
+        self.length = 0
+        # AAD z dopełnieniem do 16 bajtów idzie przed szyfrogramem (RFC 8439)
+        self.aad_length = len(aad)
+        self.mac.update(aad + bytes(-len(aad) % 16))
+
+    def update(self, data):
+        out = self.ctx.update(data)
+        self.mac.update(out if self.encrypting else data)
+        self.length += len(data)
+        return out
+
+    def update_into(self, data, buf):
+        written = self.ctx.update_into(data, buf)
+        if self.encrypting:
+            with memoryview(buf)[:written] as ciphertext:
+                self.mac.update(ciphertext)
+        else:
+            self.mac.update(data)
+        self.length += written
+        return written
+
+    def finalize(self):
+        self.ctx.finalize()
+        # Dopełnienie szyfrogramu do 16 bajtów + długości AAD i szyfrogramu (RFC 8439)
+        self.mac.update(bytes(-self.length % 16) + struct.pack("<QQ", self.aad_length, self.length))
+        if self.encrypting:
+            return self.mac.finalize()
+        try:
+            self.mac.verify(self.tag)
+        except InvalidSignature:
+            raise IntegrityError("INTEGRITY CHECK FAILED: file was modified or token is wrong.")
+        return b""
+
+
+SUITES = {suite.suite_id: suite for suite in (AesCtrSuite(), AesGcmSuite(), ChaCha20Suite(), ChaCha20Poly1305Suite())}
+SUITES_BY_NAME = {suite.name: suite for suite in SUITES.values()}
+
+# Tryb "auto" wybiera między szyframi o tych samych właściwościach co dotychczasowy format
+AUTO_CANDIDATES = ("aes-ctr", "chacha20")
+# AES-CTR zostaje, chyba że ChaCha20 jest wyraźnie szybszy - inaczej szum pomiaru
+# zmieniałby szyfr nowych plików między uruchomieniami na tym samym hoście
+AUTO_DEFAULT = "aes-ctr"
+AUTO_MARGIN = 1.25
+
+
+def get_suite(suite_id):
+    suite = SUITES.get(suite_id)
+    if suite is None:
+        raise ValueError(f"Unknown cipher suite id: {suite_id}")
+    return suite
+
+
+def benchmark_suites(names=None, size=8 * 1024 * 1024, rounds=5):
+    """Measures encryption throughput (MB/s) of each suite on this host."""
+    names = list(names or SUITES_BY_NAME)
+    data = bytes(size)
+    # Wspólny, wcześniej zapisany bufor wyjściowy - bez błędów stron w pomiarze (+zapas na blok)
+    out = bytearray(size + 64)
+    key, nonce = bytes(32), bytes(16)
+
+    def run(suite):
+        ctx = suite.encryptor(key, nonce)
+        start = time.perf_counter()
+        ctx.update_into(data, out)
+        ctx.finalize()
+        return time.perf_counter() - start
+
+    best = {}
+    # Rozgrzewka (pierwsze użycie OpenSSL) nie jest liczona
+    for name in names:
+        run(SUITES_BY_NAME[name])
+    # Rundy przeplatane, żeby chwilowe zakłócenia nie trafiały w jeden szyfr
+    for _ in range(rounds):
+        for name in names:
+            elapsed = run(SUITES_BY_NAME[name])
+            best[name] = min(best.get(name, elapsed), elapsed)
+    return {name: size / (1024 * 1024) / max(best[name], 1e-9) for name in names}
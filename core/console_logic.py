@@ -1,33 +1,101 @@
 import datetime
+import threading
+import queue
+import time
+from collections import deque
+
+LEVELS = {"DEBUG": 10, "INFO": 20, "WARNING": 30, "ERROR": 40}
 
 class ConsoleLogic:
-    def __init__(self):
+    def __init__(self, capacity=2000, level="INFO", echo_terminal=True):
         self.ui_callback = None
-        self.history = []
+        # Bufor pierścieniowy - najstarsze wpisy wypadają, gdy UI nie nadąża
+        self.history = deque(maxlen=capacity)
+        self.lock = threading.Lock()
+        self.dropped = 0
+        self.min_level = LEVELS.get(level, LEVELS["INFO"])
+
+        self.terminal_queue = None
+        if echo_terminal:
+            self.terminal_queue = queue.Queue(maxsize=capacity)
+            threading.Thread(target=self._terminal_loop, name="ConsoleEcho", daemon=True).start()
 
     def set_callback(self, callback):
-        """Connects the UI display function to the logic engine."""
+        """Connects the UI batch display function; pending messages go out on the next flush."""
         self.ui_callback = callback
-        if self.history and self.ui_callback:
-            for msg in self.history:
-                self.ui_callback(msg)
-            self.history.clear()
+
+    def set_level(self, level):
+        """Changes the minimum level accepted by the logger."""
+        level = level.upper()
+        if level not in LEVELS:
+            raise ValueError(f"Unknown log level: {level}")
+        self.min_level = LEVELS[level]
 
     def log(self, message, level="INFO"):
-        """Main logging method. Formats and dispatches messages to UI or buffer."""
+        """Main logging method. Formats and enqueues messages; safe to call from worker threads."""
+        if LEVELS.get(level, LEVELS["INFO"]) < self.min_level:
+            return
         timestamp = datetime.datetime.now().strftime("%H:%M:%S")
         formatted_msg = f"[{timestamp}] [{level}] {message}"
-        
-        if not self.ui_callback:
+
+        with self.lock:
+            if len(self.history) == self.history.maxlen:
+                self.dropped += 1
             self.history.append(formatted_msg)
-        else:
-            self.ui_callback(formatted_msg)
-            
-        # Always output to system terminal for debugging
-        print(formatted_msg)
+
+        if self.terminal_queue is not None:
+            try:
+                self.terminal_queue.put_nowait(formatted_msg)
+            except queue.Full:
+                pass
+
+    def drain(self, max_items=500):
+        """Takes up to max_items pending messages out of the ring buffer."""
+        with self.lock:
+            batch = []
+            if self.dropped:
+                batch.append(f"[...] {self.dropped} older messages dropped")
+                self.dropped = 0
+            while self.history and len(batch) < max_items:
+                batch.append(self.history.popleft())
+        return batch
+
+    def flush(self, max_items=500):
+        """Delivers one batch to the UI callback. Meant to be driven by a UI timer."""
+        if not self.ui_callback:
+            return
+        batch = self.drain(max_items)
+        if batch:
+            self.ui_callback(batch)
+
+    def _terminal_loop(self):
+        # Wypisywanie do terminala poza wątkiem UI i wątkami roboczymi
+        while True:
+            print(self.terminal_queue.get())
 
     def log_error(self, message):
         self.log(message, level="ERROR")
 
     def log_warning(self, message):
-        self.log(message, level="WARNING")
\ No newline at end of file
+        self.log(message, level="WARNING")
+
+
+class ThrottledEmitter:
+    """Rate-limits a signal-like object: drops repeats and emissions closer than `interval` seconds."""
+
+    def __init__(self, signal, interval=0.1):
+        self.signal = signal
+        self.interval = interval
+        self.last_value = None
+        self.last_time = 0.0
+
+    def emit(self, value):
+        if value == self.last_value:
+            return
+        now = time.monotonic()
+        # Wartości końcowe (100%) przepuszczamy zawsze
+        if value != 100 and now - self.last_time < self.interval:
+            return
+        self.last_value = value
+        self.last_time = now
+        self.signal.emit(value)
@@ -1,18 +1,86 @@
 import os
-from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
 from cryptography.hazmat.primitives.kdf.argon2 import Argon2id
-from cryptography.hazmat.backends import default_backend
 from core.meta_handler import MetaHandler
+from core.cipher_suites import SUITES_BY_NAME, AUTO_CANDIDATES, AUTO_DEFAULT, AUTO_MARGIN, benchmark_suites, get_suite
+
+# Wzorzec warstwy XOR powtarza się co 256 bajtów, więc bloki muszą być wielokrotnością 256
+XOR_PATTERN = bytes((0xDB + i) % 256 for i in range(256))
+XOR_BLOCK = 8 * 1024 * 1024
+
+# Pełnowymiarowy wzorzec jako liczba - liczony raz na proces (~8MB)
+_full_xor_pad = None
+
+def _make_xor_pad(size: int) -> int:
+    reps = -(-size // len(XOR_PATTERN))
+    return int.from_bytes((XOR_PATTERN * reps)[:size], "little")
+
+def _xor_pad(size: int) -> int:
+    """Only the full-block pad is kept; the (at most one per call) shorter tail is built on the fly."""
+    global _full_xor_pad
+    if size != XOR_BLOCK:
+        return _make_xor_pad(size)
+    if _full_xor_pad is None:
+        _full_xor_pad = _make_xor_pad(XOR_BLOCK)
+    return _full_xor_pad
+
+def xor_layer(data, out=None):
+    """Applies the custom XOR layer at C speed; `out` may alias `data` for in-place use."""
+    view = memoryview(data)
+    if out is None:
+        out = bytearray(len(view))
+    for off in range(0, len(view), XOR_BLOCK):
+        part = view[off:off + XOR_BLOCK]
+        size = len(part)
+        out[off:off + size] = (int.from_bytes(part, "little") ^ _xor_pad(size)).to_bytes(size, "little")
+    return out
+
+# Największy blok wśród szyfrów (ChaCha20: 64 bajty) minus 1
+UPDATE_INTO_SLACK = 63
+
+# Wynik mikro-benchmarku liczony raz na proces
+_auto_suite = None
+
+def select_suite(preference="auto"):
+    """Resolves a suite name or "auto" (AUTO_DEFAULT unless another candidate is clearly faster here)."""
+    global _auto_suite
+    if preference != "auto":
+        if preference not in SUITES_BY_NAME:
+            raise ValueError(f"Unknown cipher suite: {preference}")
+        return SUITES_BY_NAME[preference]
+    if _auto_suite is None:
+        results = benchmark_suites(AUTO_CANDIDATES)
+        fastest = max(results, key=results.get)
+        if results[fastest] < results[AUTO_DEFAULT] * AUTO_MARGIN:
+            fastest = AUTO_DEFAULT
+        _auto_suite = SUITES_BY_NAME[fastest]
+    return _auto_suite
+
+def update_into(ctx, data, out_view, start: int) -> int:
+    """Runs a cipher context straight into out_view[start:], with a scratch fallback for the tail."""
+    size = len(data)
+    try:
+        # Starsze wersje cryptography wymagają zapasu block_size - 1 w buforze docelowym
+        # Wycinki zwalniamy jawnie - traceback nie może trzymać eksportu mmap
+        with out_view[start:start + size + UPDATE_INTO_SLACK] as target:
+            return ctx.update_into(data, target)
+    except ValueError:
+        scratch = bytearray(size + UPDATE_INTO_SLACK)
+        written = ctx.update_into(data, scratch)
+        with out_view[start:start + written] as target:
+            target[:] = memoryview(scratch)[:written]
+        return written
 
 class CyphEngine:
-    def __init__(self):
+    def __init__(self, suite=None):
         self.salt_size = 16
-        self.nonce_size = 16 # AES block size for CTR
+        self.nonce_size = 16 # AES block size for CTR, counter + nonce for ChaCha20
         self.iterations = 2
         self.memory_cost = 65536
         self.parallelism = 4
         self.meta = MetaHandler()
         self.full_header_size = 32 + self.meta.meta_size
+        # Szyfr dla nowych plików: nazwa, "auto" (benchmark) lub zmienna UNLOCKEND_CIPHER
+        self.suite = select_suite(suite or os.environ.get("UNLOCKEND_CIPHER", "auto"))
 
     def _derive_key(self, token: str, salt: bytes) -> bytes:
         kdf = Argon2id(
@@ -28,40 +96,57 @@ class CyphEngine:
         salt = os.urandom(self.salt_size)
         nonce = os.urandom(self.nonce_size)
         
-        meta_header = self.meta.generate_header(token) 
+        meta_header = self.meta.generate_header(token, self.suite.suite_id) 
         
         key = self._derive_key(token, salt)
-        cipher = Cipher(algorithms.AES(key), modes.CTR(nonce), backend=default_backend())
         
         combined_header = salt + nonce + meta_header
-        return StreamingContext(cipher.encryptor(), combined_header)
+        aad = self._aad(combined_header)
+        return StreamingContext(self.suite.encryptor(key, nonce, aad), combined_header, self.suite.tag_size)
+
+    def _aad(self, header: bytes) -> bytes:
+        # Szyfry z tagiem uwierzytelniają też nagłówek (sól, nonce, szyfr, UUID, skrót)
+        return header[:32] + self.meta.authenticated_part(header[32:])
 
-    def get_streaming_decryptor(self, token: str, header: bytes):
+    def get_streaming_decryptor(self, token: str, header: bytes, suite_id: int = 1, tag: bytes = b""):
+        """Decryptor for the suite recorded in the file header, regardless of this host's choice.
+
+        `header` is the full file header (crypto header + metadata).
+        """
         salt = header[:self.salt_size]
         nonce = header[self.salt_size:self.salt_size + self.nonce_size]
         key = self._derive_key(token, salt)
         
-        cipher = Cipher(algorithms.AES(key), modes.CTR(nonce), backend=default_backend())
-        return cipher.decryptor()
+        return get_suite(suite_id).decryptor(key, nonce, tag, self._aad(header))
 
 class StreamingContext:
-    def __init__(self, engine, header):
+    def __init__(self, engine, header, tag_size=0):
         self.engine = engine
         self.header = header
+        self.tag_size = tag_size
         self.header_sent = False
 
     def update(self, data: bytes) -> bytes:
         # Custom XOR layer integrated into stream
-        processed = bytearray(data)
-        for i in range(len(processed)):
-            processed[i] ^= (0xDB + i) % 256
-        
-        ciphertext = self.engine.update(bytes(processed))
+        ciphertext = self.engine.update(xor_layer(data))
         
         if not self.header_sent:
             self.header_sent = True
             return self.header + ciphertext
         return ciphertext
 
+    def update_into(self, data, out_view, start: int, scratch=None) -> int:
+        """Zero-copy variant of update(); the caller places self.header in the output itself."""
+        self.header_sent = True
+        if scratch is not None:
+            scratch = memoryview(scratch)[:len(data)]
+        return update_into(self.engine, xor_layer(data, scratch), out_view, start)
+
     def finalize(self) -> bytes:
-        return self.engine.finalize()
\ No newline at end of file
+        # Dla szyfrów z uwierzytelnieniem zwraca tag dopisywany na końcu pliku
+        tail = self.engine.finalize()
+        if not self.header_sent:
+            # Pusty plik wejściowy - nagłówek i tak musi trafić do wyjścia
+            self.header_sent = True
+            return self.header + tail
+        return tail
\ No newline at end of file
@@ -0,0 +1,178 @@
+import os
+import json
+import stat
+import socket
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from core.console_logic import ThrottledEmitter
+from core.daemon_client import default_socket_path, peer_uid, socket_owner
+
+# Protokół: jedna linia JSON na żądanie / zdarzenie.
+#   -> {"id": 1, "op": "lock", "path": "...", "direct_io": null}
+#   <- {"id": 1, "event": "progress", "value": 42}
+#   <- {"id": 1, "event": "result", "ok": true, "result": "<token>"}
+
+
+class _EventSink:
+    """Signal-like object handed to the engine; forwards emits from worker threads to the client."""
+
+    def __init__(self, daemon, loop, writer, req_id, event):
+        self.daemon = daemon
+        self.loop = loop
+        self.writer = writer
+        self.req_id = req_id
+        self.event = event
+
+    def emit(self, value):
+        msg = {"id": self.req_id, "event": self.event, "value": value}
+        self.loop.call_soon_threadsafe(self.daemon._send, self.writer, msg)
+
+
+class EngineDaemon:
+    """Long-lived local service running UnlockAppEngine operations over a Unix socket."""
+
+    def __init__(self, engine, socket_path=None, workers=None, logger=None):
+        self.engine = engine
+        # Usługa nie uruchamia xdg-open dla odblokowanych plików
+        self.engine.auto_open = False
+        # Domyślna ścieżka ustalana w serve() - jej błędy trafiają do loggera, nie do __init__
+        self.socket_path = socket_path
+        self.workers = workers or min(4, os.cpu_count() or 1)
+        self.logger = logger or engine.logger
+        self.pool = None
+        self.error = None
+
+    def _send(self, writer, msg):
+        if not writer.is_closing():
+            writer.write((json.dumps(msg) + "\n").encode())
+
+    def _claim_socket_path(self):
+        try:
+            st = os.lstat(self.socket_path)
+        except FileNotFoundError:
+            return
+        # Cudzego pliku/gniazda nie usuwamy ani nie przejmujemy
+        if st.st_uid != os.getuid():
+            raise RuntimeError(f"{self.socket_path} belongs to another user (uid {st.st_uid}).")
+        if not stat.S_ISSOCK(st.st_mode):
+            raise RuntimeError(f"{self.socket_path} exists and is not a socket.")
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(self.socket_path)
+        except OSError:
+            # Pozostałość po poprzednim procesie
+            os.remove(self.socket_path)
+        else:
+            owner = socket_owner(probe, self.socket_path)
+            raise RuntimeError(f"Daemon already running on {self.socket_path} (uid {owner})")
+        finally:
+            probe.close()
+
+    async def serve(self):
+        if not hasattr(asyncio, "start_unix_server"):
+            raise RuntimeError("Daemon mode requires Unix domain sockets.")
+        if self.socket_path is None:
+            self.socket_path = default_socket_path()
+        self._claim_socket_path()
+        self.pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="UnlockDaemon")
+        server = await asyncio.start_unix_server(self._handle_client, path=self.socket_path)
+        # Tokeny przechodzą przez gniazdo - dostęp tylko dla właściciela. Bez zmiany umask
+        # (dotyczy całego procesu, a w --serve pliki tworzą też inne wątki); okno przed chmod
+        # zamyka prywatny katalog 0700 i sprawdzanie UID klienta w _handle_client
+        os.chmod(self.socket_path, 0o600)
+        self.logger.log(f"Daemon listening on {self.socket_path} ({self.workers} workers)")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.pool.shutdown(wait=True)
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+
+    def run(self):
+        """Blocks serving requests until interrupted; returns False if the service could not run."""
+        try:
+            asyncio.run(self.serve())
+        except KeyboardInterrupt:
+            pass
+        except Exception as e:
+            # W wątku obok aplikacji wyjątek przepadłby w threading.excepthook
+            self.error = str(e)
+            self.logger.log_error(f"Daemon stopped: {e}")
+            return False
+        return True
+
+    def start_in_thread(self):
+        """Runs the service next to the tray app."""
+        thread = threading.Thread(target=self.run, name="UnlockDaemon", daemon=True)
+        thread.start()
+        return thread
+
+    async def _handle_client(self, reader, writer):
+        tasks = set()
+        sock = writer.get_extra_info("socket")
+        uid = peer_uid(sock) if sock is not None else None
+        if uid is not None and uid != os.getuid():
+            self.logger.log_warning(f"Daemon rejected connection from uid {uid}")
+            writer.close()
+            return
+        try:
+            while line := await reader.readline():
+                try:
+                    req = json.loads(line)
+                except ValueError:
+                    req = None
+                # Poprawny JSON, ale nie obiekt (np. `5` albo `[]`), też jest błędnym żądaniem
+                if not isinstance(req, dict):
+                    self._send(writer, {"id": None, "event": "result", "ok": False, "error": "Malformed request."})
+                    continue
+                # Żądania z jednego połączenia mogą się wykonywać równolegle
+                task = asyncio.create_task(self._dispatch(req, writer))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            writer.close()
+
+    def _run(self, operation, *args):
+        """Runs an engine call on a worker thread; the engine keeps its last error per thread."""
+        self.engine.clear_error()
+        result = operation(*args)
+        return (result, *self.engine.last_error())
+
+    async def _dispatch(self, req, writer):
+        loop = asyncio.get_running_loop()
+        req_id = req.get("id")
+        op = req.get("op")
+        progress = ThrottledEmitter(_EventSink(self, loop, writer, req_id, "progress"))
+        status = _EventSink(self, loop, writer, req_id, "status")
+
+        try:
+            error, remaining = None, None
+            if op == "ping":
+                result = "pong"
+            elif op == "lock":
+                result, error, remaining = await loop.run_in_executor(
+                    self.pool, self._run, self.engine.process_file_lock,
+                    req["path"], progress, status, req.get("direct_io"))
+            elif op == "unlock":
+                result, error, remaining = await loop.run_in_executor(
+                    self.pool, self._run, self.engine.prepare_for_edit,
+                    req["path"], req["token"], progress, status, req.get("direct_io"))
+            elif op == "attempts":
+                result = await loop.run_in_executor(self.pool, self.engine.get_remaining_attempts, req["path"])
+            else:
+                raise ValueError(f"Unknown operation: {op}")
+
+            msg = {"id": req_id, "event": "result", "ok": result is not None, "result": result}
+            if result is None:
+                # Skrypt musi wiedzieć, że traci próby (WRONG TOKEN / PERMANENT LOSS)
+                msg["error"] = error or "Operation failed."
+                if remaining is not None:
+                    msg["remaining"] = remaining
+        except Exception as e:
+            self.logger.log(f"Daemon request error: {e}", level="ERROR")
+            msg = {"id": req_id, "event": "result", "ok": False, "error": str(e)}
+        self._send(writer, msg)
@@ -0,0 +1,139 @@
+import os
+import json
+import stat
+import struct
+import socket
+import itertools
+import tempfile
+
+# Moduł kliencki celowo używa tylko biblioteki standardowej - szybki start skryptów
+
+
+class DaemonError(RuntimeError):
+    """Raised when the daemon reports a failed request; `remaining` is set for token failures."""
+
+    def __init__(self, message, remaining=None):
+        super().__init__(message)
+        self.remaining = remaining
+
+
+def _private_dir(path):
+    """Creates (if missing) and validates a directory only the current user can access."""
+    try:
+        os.mkdir(path, 0o700)
+    except FileExistsError:
+        pass
+    # lstat - dowiązanie symboliczne podstawione przez kogoś innego też odpada
+    st = os.lstat(path)
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() or st.st_mode & 0o077:
+        raise DaemonError(f"Unsafe socket directory (must be a 0700 dir owned by you): {path}")
+    return path
+
+
+def default_socket_path():
+    """Per-user socket inside a private directory ($XDG_RUNTIME_DIR when available)."""
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if not runtime_dir:
+        # Wspólny katalog tymczasowy - gniazdo tylko we własnym podkatalogu 0700
+        runtime_dir = os.path.join(tempfile.gettempdir(), f"unlockend-{os.getuid()}")
+    return os.path.join(_private_dir(runtime_dir), "unlockend.sock")
+
+
+def peer_uid(sock):
+    """UID of the process at the other end of a Unix socket, or None if the OS cannot tell."""
+    if not hasattr(socket, "SO_PEERCRED"):
+        return None
+    # struct ucred: pid, uid, gid
+    creds = sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i"))
+    return struct.unpack("3i", creds)[1]
+
+
+def socket_owner(sock, path):
+    """Peer credentials where available, otherwise the owner of the socket file."""
+    uid = peer_uid(sock)
+    return os.stat(path).st_uid if uid is None else uid
+
+
+class DaemonClient:
+    """Thin client for EngineDaemon; keeps one connection open across calls."""
+
+    def __init__(self, socket_path=None, timeout=None):
+        # Domyślna ścieżka ustalana dopiero przy połączeniu (może zgłosić DaemonError)
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self.sock = None
+        self.stream = None
+        self.ids = itertools.count(1)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def connect(self):
+        if self.sock is None:
+            if self.socket_path is None:
+                self.socket_path = default_socket_path()
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(self.socket_path)
+                # Tokeny idą przez gniazdo - nie rozmawiamy z procesem innego użytkownika
+                owner = socket_owner(sock, self.socket_path)
+                if owner != os.getuid():
+                    raise DaemonError(f"Socket {self.socket_path} is served by another user (uid {owner}).")
+            except BaseException:
+                sock.close()
+                raise
+            self.sock = sock
+            self.stream = sock.makefile("rwb")
+
+    def close(self):
+        if self.sock is not None:
+            self.stream.close()
+            self.sock.close()
+            self.sock = None
+            self.stream = None
+
+    def call(self, op, on_progress=None, on_status=None, **params):
+        """Sends one request and consumes its events until the final result arrives."""
+        self.connect()
+        req_id = next(self.ids)
+        request = dict(params, id=req_id, op=op)
+        self.stream.write((json.dumps(request) + "\n").encode())
+        self.stream.flush()
+
+        while True:
+            line = self.stream.readline()
+            if not line:
+                self.close()
+                raise DaemonError("Connection closed by daemon.")
+            msg = json.loads(line)
+            if msg.get("id") != req_id:
+                continue
+            event = msg.get("event")
+            if event == "progress":
+                if on_progress: on_progress(msg["value"])
+            elif event == "status":
+                if on_status: on_status(msg["value"])
+            elif event == "result":
+                if not msg.get("ok"):
+                    raise DaemonError(msg.get("error", "Operation failed."), msg.get("remaining"))
+                return msg.get("result")
+
+    def ping(self):
+        return self.call("ping")
+
+    def lock(self, path, direct_io=None, on_progress=None, on_status=None):
+        """Returns the token of the newly locked item."""
+        return self.call("lock", on_progress, on_status, path=os.path.abspath(path), direct_io=direct_io)
+
+    def unlock(self, path, token, direct_io=None, on_progress=None, on_status=None):
+        """Returns the path of the restored file or folder."""
+        return self.call("unlock", on_progress, on_status,
+                         path=os.path.abspath(path), token=token, direct_io=direct_io)
+
+    def attempts(self, path):
+        return self.call("attempts", path=os.path.abspath(path))
@@ -1,10 +1,13 @@
 import os
 import tarfile
 import shutil
+import threading
 import subprocess
-import struct
 from PyQt6.QtCore import QThread, pyqtSignal
-from core.cyph_engine import CyphEngine
+from core.console_logic import ThrottledEmitter
+from core.cyph_engine import CyphEngine, update_into, xor_layer
+from core.cipher_suites import IntegrityError, get_suite
+from core.io_backend import IOBackend, PreallocationUnsupported
 from core.token import get_token
 
 class UnlockAppEngine:
@@ -13,7 +16,16 @@ class UnlockAppEngine:
         self.cypher = CyphEngine()
         # 256MB to złoty środek dla 1GB zużycia RAM i max prędkości SSD
         self.chunk_size = 256 * 1024 * 1024  
-        self.logger.log(f"UnlockAppEngine initialized (256MB Buffer Mode).")
+        # Domyślnie przez page cache; O_DIRECT można włączyć per operacja
+        self.direct_io = False
+        self.io = IOBackend(self.chunk_size, logger)
+        # Blok przetwarzania dla ścieżki mmap (wielokrotność 256 - wzorzec XOR)
+        self.map_block = 8 * 1024 * 1024
+        # Tryb usługi (daemon) nie powinien otwierać plików w systemie po odblokowaniu
+        self.auto_open = True
+        # Ostatni błąd per wątek - wywołujący widzą tylko None (daemon, UnlockWorker)
+        self._last_error = threading.local()
+        self.logger.log(f"UnlockAppEngine initialized (256MB Buffer Mode, cipher: {self.cypher.suite.name}).")
 
     def get_remaining_attempts(self, encrypted_path):
         """Szybki podgląd licznika prób bezpośrednio z nagłówka pliku .end."""
@@ -24,13 +36,30 @@ class UnlockAppEngine:
             crypto_header_size = 32
             with open(encrypted_path, 'rb') as f:
                 f.seek(crypto_header_size)
-                meta_raw = f.read(self.cypher.meta.meta_size)
-                data = struct.unpack(self.cypher.meta.header_format, meta_raw)
+                data = self.cypher.meta.unpack(self._read_meta(f))
                 return data[-1] 
         except Exception as e:
             self.logger.log(f"Counter read error: {e}", level="ERROR")
             return 3 
 
+    def clear_error(self):
+        self._last_error.message = None
+        self._last_error.remaining = None
+
+    def last_error(self):
+        """(message, remaining attempts or None) of the last failed operation on this thread."""
+        return getattr(self._last_error, "message", None), getattr(self._last_error, "remaining", None)
+
+    def _fail(self, context, e):
+        self._last_error.message = str(e)
+        self.logger.log(f"{context}: {e}", level="ERROR")
+
+    def _read_meta(self, f):
+        """Reads the metadata block at the current position; its size depends on the header version."""
+        prefix = f.read(self.cypher.meta.prefix_size)
+        meta_size = self.cypher.meta.size_for(prefix)
+        return prefix + f.read(meta_size - len(prefix))
+
     def _shred_now(self, filepath):
         """Całkowita destrukcja pliku - nadpisuje losowymi danymi przed usunięciem."""
         if os.path.exists(filepath):
@@ -42,7 +71,8 @@ class UnlockAppEngine:
             os.remove(filepath)
             self.logger.log(f"FILE DESTROYED: {filepath}", level="ERROR")
 
-    def process_file_lock(self, filepath, progress_sig=None, status_sig=None):
+    def process_file_lock(self, filepath, progress_sig=None, status_sig=None, direct_io=None):
+        if direct_io is None: direct_io = self.direct_io
         is_dir = os.path.isdir(filepath)
         work_path = filepath
         if is_dir:
@@ -58,16 +88,16 @@ class UnlockAppEngine:
             token = get_token(12)
             file_size = os.path.getsize(work_path)
             
-            with open(work_path, 'rb', buffering=self.chunk_size) as f_in, \
-                 open(atomic_path, 'wb', buffering=self.chunk_size) as f_out:
-                encryptor = self.cypher.get_streaming_encryptor(token)
-                processed = 0
-                while chunk := f_in.read(self.chunk_size):
-                    f_out.write(encryptor.update(chunk))
-                    processed += len(chunk)
-                    if progress_sig:
-                        progress_sig.emit(int((processed / file_size) * 95))
-                f_out.write(encryptor.finalize())
+            encryptor = self.cypher.get_streaming_encryptor(token)
+            # Zwykłe pliki idą przez mmap (zero kopii), potoki i O_DIRECT przez strumień
+            mapped = not direct_io and self.io.can_map(work_path)
+            if mapped:
+                try:
+                    self._lock_mapped(work_path, atomic_path, encryptor, progress_sig)
+                except PreallocationUnsupported:
+                    mapped = False
+            if not mapped:
+                self._lock_streaming(work_path, atomic_path, encryptor, file_size, progress_sig, direct_io)
             
             if os.path.exists(target_path): os.remove(target_path)
             os.rename(atomic_path, target_path)
@@ -82,89 +112,228 @@ class UnlockAppEngine:
             return token
 
         except Exception as e:
-            self.logger.log(f"Lock error: {e}", level="ERROR")
+            self._fail("Lock error", e)
             if os.path.exists(atomic_path): os.remove(atomic_path)
             if is_dir and os.path.exists(work_path): os.remove(work_path)
             return None
 
-    def prepare_for_edit(self, encrypted_path, token, progress_sig=None, status_sig=None):
+    def _emit_progress(self, progress_sig, processed, total):
+        # Potok/FIFO ma rozmiar 0 - postępu nie da się policzyć, pasek czeka na 100
+        if progress_sig and total > 0:
+            progress_sig.emit(min(95, int((processed / total) * 95)))
+
+    def _lock_streaming(self, work_path, atomic_path, encryptor, file_size, progress_sig, direct_io):
+        with self.io.open_reader(work_path, direct=direct_io) as f_in, \
+             self.io.open_writer(atomic_path, self.cypher.full_header_size + file_size + encryptor.tag_size,
+                                 direct=direct_io) as f_out:
+            processed = 0
+            while chunk := f_in.read():
+                f_out.write(encryptor.update(chunk))
+                processed += len(chunk)
+                self._emit_progress(progress_sig, processed, file_size)
+            f_out.write(encryptor.finalize())
+
+    def _lock_mapped(self, work_path, atomic_path, encryptor, progress_sig):
+        header_size = len(encryptor.header)
+        with self.io.map_reader(work_path) as src:
+            file_size = src.size
+            with self.io.map_writer(atomic_path, header_size + file_size + encryptor.tag_size) as dst:
+                dst.view[:header_size] = encryptor.header
+                scratch = bytearray(self.map_block)
+                for off in range(0, file_size, self.map_block):
+                    # Wycinki memoryview trzeba zwolnić, inaczej mmap nie da się zamknąć
+                    with src.view[off:off + self.map_block] as block:
+                        encryptor.update_into(block, dst.view, header_size + off, scratch)
+                        processed = off + len(block)
+                    # Gotowe zakresy od razu wypadają z page cache, jak w ścieżce strumieniowej
+                    src.drop(off, processed - off)
+                    dst.drop(header_size + off, processed - off)
+                    self._emit_progress(progress_sig, processed, file_size)
+                # Tag (jeśli szyfr go ma) zajmuje ostatnie bajty pliku
+                dst.view[header_size + file_size:] = encryptor.finalize()
+
+    def _unlock_streaming(self, encrypted_path, temp_path, decryptor, header_size, file_size, progress_sig, direct_io):
+        with self.io.open_reader(encrypted_path, header_size, direct=direct_io, end=header_size + file_size) as f_in, \
+             self.io.open_writer(temp_path, file_size, direct=direct_io) as f_out:
+            processed = 0
+            while chunk := f_in.read():
+                # 1. Deszyfrowanie AES  2. Przywrócenie XOR (Kluczowe dla poprawnego TAR)
+                f_out.write(xor_layer(decryptor.update(chunk)))
+                processed += len(chunk)
+                self._emit_progress(progress_sig, processed, file_size)
+            f_out.write(decryptor.finalize())
+
+    def _unlock_mapped(self, encrypted_path, temp_path, decryptor, header_size, file_size, progress_sig):
+        with self.io.map_reader(encrypted_path) as src, \
+             self.io.map_writer(temp_path, file_size) as dst:
+            for off in range(0, file_size, self.map_block):
+                end = header_size + min(off + self.map_block, file_size)
+                with src.view[header_size + off:end] as block:
+                    written = update_into(decryptor, block, dst.view, off)
+                # XOR w miejscu, bezpośrednio na mapowaniu wyjścia
+                with dst.view[off:off + written] as out:
+                    xor_layer(out, out)
+                src.drop(header_size + off, end - header_size - off)
+                dst.drop(off, written)
+                self._emit_progress(progress_sig, off + written, file_size)
+            decryptor.finalize()
+
+    def prepare_for_edit(self, encrypted_path, token, progress_sig=None, status_sig=None, direct_io=None):
+        if direct_io is None: direct_io = self.direct_io
         temp_path = encrypted_path + ".tmp_dec"
         try:
             if status_sig: status_sig.emit("Checking Token Integrity...")
             crypto_header_size = 32
-            full_header_size = 32 + self.cypher.meta.meta_size
             
             with open(encrypted_path, 'r+b') as f_target:
-                full_header = f_target.read(full_header_size)
-                if len(full_header) < full_header_size:
+                crypto_header = f_target.read(crypto_header_size)
+                meta_raw = self._read_meta(f_target)
+                full_header_size = crypto_header_size + len(meta_raw)
+                if len(crypto_header) < crypto_header_size or len(meta_raw) < self.cypher.meta.size_for(meta_raw):
                     raise ValueError("File corrupted: Header too short.")
 
-                meta_raw = full_header[crypto_header_size:]
                 meta_res = self.cypher.meta.parse_header(meta_raw, token)
                 
                 if meta_res.get("status") == "DESTROY":
+                    self._last_error.remaining = 0
                     f_target.close()
                     self._shred_now(encrypted_path)
                     raise ValueError("PERMANENT LOSS: 3 failed attempts.")
 
                 if meta_res.get("status") == "WRONG_TOKEN":
                     rem = meta_res["remaining"]
+                    self._last_error.remaining = rem
                     updated_meta = self.cypher.meta.pack_updated_attempts(meta_res["raw_data"], rem)
                     f_target.seek(crypto_header_size)
                     f_target.write(updated_meta)
                     f_target.flush()
                     raise ValueError(f"WRONG TOKEN! Remaining: {rem}")
 
-                if status_sig: status_sig.emit("Token OK. Decrypting...")
-                
-                f_target.seek(full_header_size)
-                file_size = os.path.getsize(encrypted_path) - full_header_size
-                processed = 0
-
-                with open(temp_path, 'wb', buffering=self.chunk_size) as f_out:
-                    decryptor = self.cypher.get_streaming_decryptor(token, full_header[:crypto_header_size])
-                    while chunk := f_target.read(self.chunk_size):
-                        # 1. Deszyfrowanie AES
-                        decrypted_chunk = decryptor.update(chunk)
-                        
-                        # 2. Przywrócenie XOR (Kluczowe dla poprawnego TAR)
-                        processed_chunk = bytearray(decrypted_chunk)
-                        for i in range(len(processed_chunk)):
-                            processed_chunk[i] ^= (0xDB + i) % 256
-                        
-                        f_out.write(processed_chunk)
-                        processed += len(chunk)
-                        if progress_sig:
-                            progress_sig.emit(int((processed / file_size) * 95))
-                    f_out.write(decryptor.finalize())
-
-            # --- ROZPAKOWYWANIE ---
-            original_path = encrypted_path.replace(".end", "")
+                # Szyfr zapisany w nagłówku - niezależnie od wyboru na tym hoście
+                suite = get_suite(meta_res["suite"])
+                tag = b""
+                if suite.tag_size:
+                    f_target.seek(-suite.tag_size, os.SEEK_END)
+                    tag = f_target.read(suite.tag_size)
+
+            if status_sig: status_sig.emit("Token OK. Decrypting...")
             
-            # Wymuszamy sprawdzenie czy to TAR
-            if tarfile.is_tarfile(temp_path):
-                if status_sig: status_sig.emit("Extracting project folder...")
-                extract_dir = os.path.dirname(original_path)
-                with tarfile.open(temp_path, "r") as tar:
-                    tar.extractall(path=extract_dir)
-                os.remove(temp_path)
-                final_output = original_path
-            else:
-                # Jeśli to był pojedynczy plik
-                if os.path.exists(original_path): os.remove(original_path)
-                os.rename(temp_path, original_path)
-                final_output = original_path
+            file_size = os.path.getsize(encrypted_path) - full_header_size - suite.tag_size
+            if file_size < 0:
+                raise ValueError("File corrupted: Payload too short.")
+            decryptor = self.cypher.get_streaming_decryptor(token, crypto_header + meta_raw, suite.suite_id, tag)
+            mapped = not direct_io and file_size > 0 and self.io.can_map(encrypted_path)
+            if mapped:
+                try:
+                    self._unlock_mapped(encrypted_path, temp_path, decryptor, full_header_size, file_size, progress_sig)
+                except PreallocationUnsupported:
+                    mapped = False
+            if not mapped:
+                self._unlock_streaming(encrypted_path, temp_path, decryptor, full_header_size, file_size, progress_sig, direct_io)
+
+            original_path = encrypted_path.replace(".end", "")
+            final_output = self._unpack_output(temp_path, original_path, status_sig)
 
             if os.path.exists(encrypted_path): os.remove(encrypted_path)
             if progress_sig: progress_sig.emit(100)
-            self._open_in_system(final_output)
+            if self.auto_open: self._open_in_system(final_output)
             return final_output
 
         except Exception as e:
-            self.logger.log(f"Unlock error: {e}", level="ERROR")
+            self._fail("Unlock error", e)
+            # Niezweryfikowanej treści nie zostawiamy na dysku
+            if isinstance(e, IntegrityError) and os.path.exists(temp_path): os.remove(temp_path)
             # ZOSTAWIAMY temp_path w razie błędu, żebyś mógł go ręcznie ratować
             return None
         
+    def _unpack_output(self, temp_path, original_path, status_sig=None, is_dir=None):
+        """Turns a decrypted temp file back into the original file or folder."""
+        # Wymuszamy sprawdzenie czy to TAR
+        if is_dir is None:
+            is_dir = tarfile.is_tarfile(temp_path)
+
+        if is_dir:
+            if status_sig: status_sig.emit("Extracting project folder...")
+            extract_dir = os.path.dirname(original_path)
+            with tarfile.open(temp_path, "r") as tar:
+                tar.extractall(path=extract_dir)
+            os.remove(temp_path)
+        else:
+            # Jeśli to był pojedynczy plik
+            if os.path.exists(original_path): os.remove(original_path)
+            os.rename(temp_path, original_path)
+        return original_path
+
+    def process_vault_lock(self, filepath, vault, progress_sig=None, status_sig=None):
+        """Stores a file/folder in a deduplicating vault and leaves a small .vend recipe in its place."""
+        is_dir = os.path.isdir(filepath)
+        work_path = filepath
+        if is_dir:
+            if status_sig: status_sig.emit("Packing folder...")
+            work_path = filepath + ".tmp_tar"
+            with tarfile.open(work_path, "w") as tar:
+                tar.add(filepath, arcname=os.path.basename(filepath))
+
+        target_path = filepath + ".vend"
+        atomic_path = target_path + ".tmp_atomic"
+
+        try:
+            if status_sig: status_sig.emit("Deduplicating into vault...")
+            recipe = vault.store_file(work_path, os.path.basename(filepath), is_dir, progress_sig)
+            vault.write_recipe(recipe, atomic_path)
+
+            if os.path.exists(target_path): os.remove(target_path)
+            os.rename(atomic_path, target_path)
+
+            if is_dir:
+                shutil.rmtree(filepath)
+                if os.path.exists(work_path): os.remove(work_path)
+            else:
+                os.remove(filepath)
+
+            if progress_sig: progress_sig.emit(100)
+            return target_path
+
+        except Exception as e:
+            self._fail("Vault lock error", e)
+            if os.path.exists(atomic_path): os.remove(atomic_path)
+            if is_dir and os.path.exists(work_path): os.remove(work_path)
+            return None
+
+    def prepare_vault_unlock(self, recipe_path, vault, progress_sig=None, status_sig=None):
+        """Rebuilds an item from its .vend recipe and releases its chunks for garbage collection."""
+        temp_path = recipe_path + ".tmp_dec"
+        try:
+            if status_sig: status_sig.emit("Reading vault recipe...")
+            recipe = vault.read_recipe(recipe_path)
+
+            if status_sig: status_sig.emit("Restoring from vault...")
+            vault.restore(recipe, temp_path, progress_sig)
+
+            original_path = recipe_path[:-len(".vend")]
+            final_output = self._unpack_output(temp_path, original_path, status_sig, recipe["is_dir"])
+
+            vault.forget(recipe["id"])
+            if os.path.exists(recipe_path): os.remove(recipe_path)
+            if progress_sig: progress_sig.emit(100)
+            if self.auto_open: self._open_in_system(final_output)
+            return final_output
+
+        except Exception as e:
+            self._fail("Vault unlock error", e)
+            return None
+
+    def run_vault_gc(self, vault, progress_sig=None, status_sig=None):
+        """Garbage-collects the vault off the UI thread; returns a short summary."""
+        try:
+            if status_sig: status_sig.emit("Collecting unreferenced vault chunks...")
+            removed, reclaimed = vault.gc()
+            if progress_sig: progress_sig.emit(100)
+            return f"Vault GC: {removed} chunks, {reclaimed // (1024 * 1024)} MB freed."
+        except Exception as e:
+            self._fail("Vault GC error", e)
+            return None
+
     def _open_in_system(self, filepath):
         try:
             if os.name == 'nt': os.startfile(filepath)
@@ -176,21 +345,31 @@ class UnlockWorker(QThread):
     progress_sig = pyqtSignal(int)
     finished_sig = pyqtSignal(bool, str)
 
-    def __init__(self, engine, mode, filepath, token=None):
+    def __init__(self, engine, mode, filepath, token=None, direct_io=None, vault=None):
         super().__init__()
         self.engine = engine
         self.mode = mode
         self.filepath = filepath
         self.token = token
+        self.direct_io = direct_io
+        self.vault = vault
 
     def run(self):
         try:
+            self.engine.clear_error()
+            progress = ThrottledEmitter(self.progress_sig)
             if self.mode == 'lock':
-                res = self.engine.process_file_lock(self.filepath, self.progress_sig, self.status_sig)
+                res = self.engine.process_file_lock(self.filepath, progress, self.status_sig, self.direct_io)
+            elif self.mode == 'vault_lock':
+                res = self.engine.process_vault_lock(self.filepath, self.vault, progress, self.status_sig)
+            elif self.mode == 'vault_unlock':
+                res = self.engine.prepare_vault_unlock(self.filepath, self.vault, progress, self.status_sig)
+            elif self.mode == 'vault_gc':
+                res = self.engine.run_vault_gc(self.vault, progress, self.status_sig)
             else:
-                res = self.engine.prepare_for_edit(self.filepath, self.token, self.progress_sig, self.status_sig)
+                res = self.engine.prepare_for_edit(self.filepath, self.token, progress, self.status_sig, self.direct_io)
             
             if res: self.finished_sig.emit(True, res)
-            else: self.finished_sig.emit(False, "Operation failed.")
+            else: self.finished_sig.emit(False, self.engine.last_error()[0] or "Operation failed.")
         except Exception as e:
             self.finished_sig.emit(False, str(e))
\ No newline at end of file
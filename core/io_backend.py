@@ -0,0 +1,386 @@
+import os
+import mmap
+import stat
+import errno
+
+# Wyrównanie wymagane przez O_DIRECT (rozmiar strony / sektora na większości systemów)
+DIRECT_ALIGNMENT = 4096
+
+HAS_FALLOCATE = hasattr(os, "posix_fallocate")
+HAS_FADVISE = hasattr(os, "posix_fadvise")
+HAS_DIRECT = hasattr(os, "O_DIRECT") and hasattr(os, "preadv")
+
+
+def _advise(fd, offset, length, advice_name):
+    """Best-effort posix_fadvise - no-op where the platform lacks it."""
+    if not HAS_FADVISE:
+        return
+    try:
+        os.posix_fadvise(fd, offset, length, getattr(os, advice_name))
+    except OSError:
+        pass
+
+
+def _aligned_buffer(size):
+    """Anonymous mmap is page-aligned, which satisfies O_DIRECT buffer rules."""
+    size += (-size) % DIRECT_ALIGNMENT
+    return mmap.mmap(-1, size)
+
+
+class IOBackend:
+    """Chooses the reader/writer pair used by the engine for a single operation."""
+
+    def __init__(self, chunk_size, logger=None):
+        if chunk_size % DIRECT_ALIGNMENT:
+            raise ValueError("chunk_size must be a multiple of the O_DIRECT alignment.")
+        self.chunk_size = chunk_size
+        self.logger = logger
+
+    def _resolve_direct(self, direct):
+        if direct and not HAS_DIRECT:
+            if self.logger:
+                self.logger.log_warning("O_DIRECT not supported here, using buffered I/O.")
+            return False
+        return direct
+
+    def open_reader(self, path, offset=0, direct=False, end=None):
+        if self._resolve_direct(direct):
+            try:
+                return DirectReader(path, self.chunk_size, offset, end)
+            except OSError as e:
+                # np. tmpfs odrzuca O_DIRECT z EINVAL
+                if self.logger:
+                    self.logger.log_warning(f"O_DIRECT open failed ({e}), using buffered I/O.")
+        return BufferedReader(path, self.chunk_size, offset, end)
+
+    def can_map(self, path):
+        """Memory mapping only makes sense for non-empty regular files (not pipes/devices)."""
+        try:
+            st = os.stat(path)
+        except OSError:
+            return False
+        return stat.S_ISREG(st.st_mode) and st.st_size > 0
+
+    def map_reader(self, path):
+        return MappedInput(path)
+
+    def map_writer(self, path, size):
+        return MappedOutput(path, size)
+
+    def open_writer(self, path, size_hint=0, direct=False):
+        if self._resolve_direct(direct):
+            try:
+                return DirectWriter(path, self.chunk_size, size_hint)
+            except OSError as e:
+                if self.logger:
+                    self.logger.log_warning(f"O_DIRECT open failed ({e}), using buffered I/O.")
+        return BufferedWriter(path, self.chunk_size, size_hint)
+
+
+class _FileBase:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+class PreallocationUnsupported(OSError):
+    """The output cannot be reserved up front, so it must not be written through a mapping."""
+
+
+def _preallocate(fd, size, strict=False):
+    """Reserves the whole output up front so the file is not grown piecemeal.
+
+    Returns True when the space is reserved. In strict mode only "not supported"
+    errors are tolerated - ENOSPC/EFBIG propagate to the caller.
+    """
+    if not HAS_FALLOCATE or size <= 0:
+        return False
+    try:
+        os.posix_fallocate(fd, 0, size)
+        return True
+    except OSError as e:
+        # System plików bez wsparcia (EOPNOTSUPP) - zapis nadal zadziała
+        if strict and e.errno not in (errno.EOPNOTSUPP, errno.EINVAL, errno.ENOSYS):
+            raise
+        return False
+
+
+class BufferedReader(_FileBase):
+    """Sequential reader that drops consumed pages from the page cache."""
+
+    def __init__(self, path, chunk_size, offset=0, end=None):
+        self.chunk_size = chunk_size
+        self.fd = os.open(path, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+        # Potoki/FIFO nie mają pozycji - pread i fadvise zwróciłyby ESPIPE
+        self.regular = stat.S_ISREG(os.fstat(self.fd).st_mode)
+        self.pos = offset
+        self.start = offset
+        # end ogranicza odczyt, np. żeby pominąć tag na końcu pliku
+        self.end = end
+        if self.regular:
+            _advise(self.fd, offset, 0, "POSIX_FADV_SEQUENTIAL")
+        else:
+            self._skip(offset)
+
+    def _skip(self, size):
+        while size:
+            data = os.read(self.fd, min(size, self.chunk_size))
+            if not data:
+                break
+            size -= len(data)
+
+    def read(self):
+        # Pełne porcje są wymagane - warstwa XOR liczy indeks od początku porcji
+        parts = []
+        remaining = self.chunk_size
+        if self.end is not None:
+            remaining = max(0, min(remaining, self.end - self.pos))
+        while remaining:
+            data = self._pread(remaining)
+            if not data:
+                break
+            parts.append(data)
+            self.pos += len(data)
+            remaining -= len(data)
+        chunk = parts[0] if len(parts) == 1 else b"".join(parts)
+        if chunk and self.regular:
+            _advise(self.fd, self.start, self.pos - self.start, "POSIX_FADV_DONTNEED")
+            self.start = self.pos
+        return chunk
+
+    def _pread(self, size):
+        if not self.regular:
+            return os.read(self.fd, size)
+        if hasattr(os, "pread"):
+            return os.pread(self.fd, size, self.pos)
+        os.lseek(self.fd, self.pos, os.SEEK_SET)
+        return os.read(self.fd, size)
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+class BufferedWriter(_FileBase):
+    """Writer that preallocates, writes back every chunk and evicts it from the cache."""
+
+    def __init__(self, path, chunk_size, size_hint=0):
+        self.chunk_size = chunk_size
+        flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0)
+        self.fd = os.open(path, flags, 0o666)
+        self.size_hint = size_hint
+        self.written = 0
+        self.flushed = 0
+        _preallocate(self.fd, size_hint)
+        _advise(self.fd, 0, 0, "POSIX_FADV_SEQUENTIAL")
+
+    def write(self, data):
+        view = memoryview(data)
+        while view:
+            n = os.write(self.fd, view)
+            view = view[n:]
+            self.written += n
+        if self.written - self.flushed >= self.chunk_size:
+            self._write_back()
+
+    def _write_back(self):
+        # DONTNEED nie usuwa brudnych stron, więc najpierw wymuszamy zapis na dysk
+        if HAS_FADVISE:
+            os.fdatasync(self.fd)
+            _advise(self.fd, self.flushed, self.written - self.flushed, "POSIX_FADV_DONTNEED")
+        self.flushed = self.written
+
+    def close(self):
+        if self.fd is None:
+            return
+        try:
+            if self.size_hint > self.written:
+                os.ftruncate(self.fd, self.written)
+            if self.written > self.flushed:
+                self._write_back()
+        finally:
+            os.close(self.fd)
+            self.fd = None
+
+
+class DirectReader(_FileBase):
+    """O_DIRECT reader - bypasses the page cache, handles unaligned start offsets."""
+
+    def __init__(self, path, chunk_size, offset=0, end=None):
+        self.chunk_size = chunk_size
+        self.fd = os.open(path, os.O_RDONLY | os.O_DIRECT)
+        self.pos = offset
+        self.end = end
+        self.buffer = _aligned_buffer(chunk_size + 2 * DIRECT_ALIGNMENT)
+        self.view = memoryview(self.buffer)
+
+    def read(self):
+        aligned_pos = self.pos - (self.pos % DIRECT_ALIGNMENT)
+        skew = self.pos - aligned_pos
+        wanted = skew + self.chunk_size
+        wanted += (-wanted) % DIRECT_ALIGNMENT
+
+        filled = 0
+        while filled < wanted:
+            n = os.preadv(self.fd, [self.view[filled:wanted]], aligned_pos + filled)
+            if n <= 0:
+                break
+            filled += n
+            if n % DIRECT_ALIGNMENT:
+                break  # krótki odczyt = koniec pliku
+
+        end = min(filled, skew + self.chunk_size)
+        if self.end is not None:
+            end = min(end, self.end - aligned_pos)
+        if end <= skew:
+            return b""
+        chunk = bytes(self.view[skew:end])
+        self.pos += len(chunk)
+        return chunk
+
+    def close(self):
+        if self.fd is not None:
+            self.view.release()
+            self.buffer.close()
+            os.close(self.fd)
+            self.fd = None
+
+
+class DirectWriter(_FileBase):
+    """O_DIRECT writer - stages data in an aligned buffer, pads the tail, truncates on close."""
+
+    def __init__(self, path, chunk_size, size_hint=0):
+        flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_DIRECT
+        self.fd = os.open(path, flags, 0o666)
+        self.capacity = chunk_size
+        self.buffer = _aligned_buffer(chunk_size)
+        self.view = memoryview(self.buffer)
+        self.fill = 0
+        self.written = 0
+        _preallocate(self.fd, size_hint)
+
+    def write(self, data):
+        src = memoryview(data)
+        while src:
+            n = min(len(src), self.capacity - self.fill)
+            self.view[self.fill:self.fill + n] = src[:n]
+            self.fill += n
+            src = src[n:]
+            if self.fill == self.capacity:
+                self._flush_aligned()
+
+    def _flush_aligned(self):
+        aligned = self.fill - (self.fill % DIRECT_ALIGNMENT)
+        self._write_out(aligned)
+        tail = self.fill - aligned
+        if tail:
+            self.view[:tail] = self.view[aligned:self.fill]
+        self.fill = tail
+
+    def _write_out(self, length):
+        done = 0
+        while done < length:
+            n = os.write(self.fd, self.view[done:length])
+            done += n
+        self.written += length
+
+    def close(self):
+        if self.fd is None:
+            return
+        try:
+            logical_size = self.written + self.fill
+            if self.fill:
+                padded = self.fill + (-self.fill) % DIRECT_ALIGNMENT
+                self.view[self.fill:padded] = bytes(padded - self.fill)
+                self._write_out(padded)
+            os.ftruncate(self.fd, logical_size)
+        finally:
+            self.view.release()
+            self.buffer.close()
+            os.close(self.fd)
+            self.fd = None
+
+
+class _MappedFile(_FileBase):
+    def drop(self, offset, length):
+        """Evicts a finished range from the mapping and the page cache (page-aligned, best effort)."""
+        start = offset - offset % mmap.ALLOCATIONGRANULARITY
+        end = min(offset + length, self.size)
+        if end < self.size:
+            # Niepełną ostatnią stronę zwolni dopiero następny blok
+            end -= end % mmap.ALLOCATIONGRANULARITY
+        if end <= start:
+            return
+        self._write_back(start, end - start)
+        if hasattr(self.map, "madvise") and hasattr(mmap, "MADV_DONTNEED"):
+            self.map.madvise(mmap.MADV_DONTNEED, start, end - start)
+        _advise(self.fd, start, end - start, "POSIX_FADV_DONTNEED")
+
+    def _write_back(self, start, length):
+        pass
+
+
+class MappedInput(_MappedFile):
+    """Read-only mapping of a whole file, exposed as a memoryview."""
+
+    def __init__(self, path):
+        self.fd = os.open(path, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+        try:
+            self.size = os.fstat(self.fd).st_size
+            self.map = mmap.mmap(self.fd, self.size, access=mmap.ACCESS_READ)
+        except Exception:
+            os.close(self.fd)
+            raise
+        if hasattr(self.map, "madvise") and hasattr(mmap, "MADV_SEQUENTIAL"):
+            self.map.madvise(mmap.MADV_SEQUENTIAL)
+        self.view = memoryview(self.map)
+
+    def close(self):
+        if self.fd is None:
+            return
+        self.view.release()
+        self.map.close()
+        _advise(self.fd, 0, 0, "POSIX_FADV_DONTNEED")
+        os.close(self.fd)
+        self.fd = None
+
+
+class MappedOutput(_MappedFile):
+    """Preallocated, writable mapping of the whole output file."""
+
+    def __init__(self, path, size):
+        flags = os.O_RDWR | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0)
+        self.fd = os.open(path, flags, 0o666)
+        try:
+            # Zapis przez mapowanie do rzadkiego pliku przy pełnym dysku kończy się SIGBUS,
+            # więc bez faktycznej rezerwacji miejsca nie mapujemy wcale
+            if not _preallocate(self.fd, size, strict=True):
+                raise PreallocationUnsupported(errno.EOPNOTSUPP, "Cannot preallocate mapped output", path)
+            os.ftruncate(self.fd, size)
+            self.map = mmap.mmap(self.fd, size, access=mmap.ACCESS_WRITE)
+        except Exception:
+            os.close(self.fd)
+            raise
+        self.size = size
+        self.view = memoryview(self.map)
+
+    def _write_back(self, start, length):
+        # DONTNEED nie usuwa brudnych stron - najpierw msync zakresu
+        self.map.flush(start, length)
+
+    def close(self):
+        if self.fd is None:
+            return
+        try:
+            self.view.release()
+            self.map.flush()
+            self.map.close()
+            # Po msync strony są czyste, więc DONTNEED faktycznie je zwalnia
+            _advise(self.fd, 0, 0, "POSIX_FADV_DONTNEED")
+        finally:
+            os.close(self.fd)
+            self.fd = None
@@ -4,35 +4,65 @@ import hashlib
 
 class MetaHandler:
     def __init__(self):
-        # Format: Magic(4b) + Version(2b) + UUID(36b) + Hash(64b) + Attempts(1b) = 107 bajtów
+        # v12: Magic(4b) + Version(2b) + UUID(36b) + Hash(64b) + Attempts(1b) = 107 bajtów
+        # v13: Magic(4b) + Version(2b) + Suite(1b) + UUID(36b) + Hash(64b) + Attempts(1b) = 108 bajtów
         self.magic = b"UEND"
-        self.version = b"12" # Podbijamy wersję
-        self.header_format = "4s2s36s64sB" 
+        self.version = b"13" # Podbijamy wersję - zapis szyfru w nagłówku
+        self.formats = {b"12": "4s2s36s64sB", b"13": "4s2sB36s64sB"}
+        self.header_format = self.formats[self.version]
         self.meta_size = struct.calcsize(self.header_format)
+        self.prefix_size = 6
         self.default_attempts = 3
+        # Pliki v12 zawsze używały AES-CTR
+        self.legacy_suite = 1
 
-    def _generate_validation(self, token: str, file_uuid: str) -> bytes:
+    def size_for(self, prefix: bytes) -> int:
+        """Returns the full metadata size based on its Magic + Version prefix."""
+        if prefix[:4] != self.magic:
+            raise ValueError("To nie jest plik UnlockEND!")
+        fmt = self.formats.get(prefix[4:6])
+        if fmt is None:
+            raise ValueError(f"Unsupported header version: {prefix[4:6]!r}")
+        return struct.calcsize(fmt)
+
+    def unpack(self, raw_header):
+        """Unpacks a header of any supported version; attempts are always the last field."""
+        fmt = self.formats.get(raw_header[4:6], self.header_format)
+        return struct.unpack(fmt, raw_header)
+
+    def _generate_validation(self, token: str, file_uuid: str, suite_id=None) -> bytes:
         content = f"{token}{file_uuid}".encode()
+        # v13: szyfr wchodzi do skrótu - podmieniony bajt szyfru daje WRONG_TOKEN (v12 bez niego)
+        if suite_id is not None:
+            content += bytes([suite_id])
         return hashlib.sha256(content).hexdigest().encode()
 
-    def generate_header(self, token: str):
+    def authenticated_part(self, raw_header: bytes) -> bytes:
+        """Metadata covered by the AEAD tag - everything but the attempts counter, which changes on wrong tokens."""
+        return raw_header[:-1]
+
+    def generate_header(self, token: str, suite_id: int):
         """Generuje nowy nagłówek z pełną pulą 3 szans."""
         file_uuid_str = str(uuid.uuid4())
-        v_hash = self._generate_validation(token, file_uuid_str)
+        v_hash = self._generate_validation(token, file_uuid_str, suite_id)
         # Na końcu dodajemy liczbę prób: 3
-        return struct.pack(self.header_format, self.magic, self.version, 
+        return struct.pack(self.header_format, self.magic, self.version, suite_id,
                            file_uuid_str.encode(), v_hash, self.default_attempts)
 
     def parse_header(self, raw_header, token_to_verify: str):
         """Sprawdza token i zarządza licznikiem prób."""
         try:
-            magic, ver, f_uuid, stored_hash, attempts = struct.unpack(self.header_format, raw_header)
+            fields = self.unpack(raw_header)
+            magic, ver = fields[0], fields[1]
+            suite = fields[2] if ver != b"12" else self.legacy_suite
+            f_uuid, stored_hash, attempts = fields[-3:]
             
             if magic != self.magic:
                 raise ValueError("To nie jest plik UnlockEND!")
             
             current_uuid = f_uuid.decode()
-            expected_hash = self._generate_validation(token_to_verify, current_uuid)
+            expected_hash = self._generate_validation(token_to_verify, current_uuid,
+                                                      suite if ver != b"12" else None)
 
             if stored_hash != expected_hash:
                 new_attempts = attempts - 1
@@ -44,12 +74,13 @@ class MetaHandler:
                     "status": "WRONG_TOKEN", 
                     "remaining": new_attempts,
                     "uuid": current_uuid,
-                    "raw_data": (magic, ver, f_uuid, stored_hash) # Potrzebne do nadpisania
+                    "raw_data": fields[:-1] # Potrzebne do nadpisania
                 }
 
             return {
                 "status": "OK",
                 "version": ver.decode(),
+                "suite": suite,
                 "uuid": current_uuid
             }
         except Exception as e:
@@ -57,4 +88,4 @@ class MetaHandler:
 
     def pack_updated_attempts(self, raw_tuple, new_attempts):
         """Pomocnicza funkcja do przygotowania danych do nadpisania licznika."""
-        return struct.pack(self.header_format, *raw_tuple, new_attempts)
\ No newline at end of file
+        return struct.pack(self.formats[raw_tuple[1]], *raw_tuple, new_attempts)
\ No newline at end of file
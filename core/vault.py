@@ -0,0 +1,325 @@
+import os
+import mmap
+import json
+import hmac
+import hashlib
+import struct
+import uuid
+import threading
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.exceptions import InvalidTag
+from core.token import get_token
+
+try:
+    # Skompilowany (Cython) FastCDC - czysto pythonowa wersja jest ~200x wolniejsza
+    from fastcdc.fastcdc_cy import fastcdc_cy
+except ImportError:
+    fastcdc_cy = None
+
+
+class ContentChunker:
+    """Splits a file at content-defined boundaries using the native FastCDC implementation."""
+
+    def __init__(self, min_size=16 * 1024, avg_size=64 * 1024, max_size=256 * 1024):
+        if fastcdc_cy is None:
+            raise RuntimeError("Vault mode requires the compiled 'fastcdc' package (pip install fastcdc).")
+        self.min_size = min_size
+        self.avg_size = avg_size
+        self.max_size = max_size
+
+    def iter_chunks(self, f):
+        """Yields memoryview slices of the mapped file; each is only valid until the next one."""
+        size = os.fstat(f.fileno()).st_size
+        if not size:
+            return
+        with mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ) as mapped:
+            view = memoryview(mapped)
+            chunks = fastcdc_cy(view, self.min_size, self.avg_size, self.max_size)
+            try:
+                for chunk in chunks:
+                    with view[chunk.offset:chunk.offset + chunk.length] as data:
+                        yield data
+            finally:
+                # Generator FastCDC trzyma własny widok na mapowanie
+                chunks.close()
+                del chunks
+                view.release()
+
+
+class Vault:
+    """Deduplicating store: unique chunks encrypted once into packs, items kept as recipes."""
+
+    MAGIC = b"UVLT"
+    RECIPE_MAGIC = b"UVRC"
+    VERSION = b"01"
+    CONFIG_NAME = "vault.cfg"
+    INDEX_NAME = "index.bin"
+    PACK_DIR = "packs"
+    # Format: Magic(4b) + Version(2b) + VaultID(16b) + Salt(16b)
+    CONFIG_FORMAT = "4s2s16s16s"
+    RECIPE_HEADER = "4s2s16s"
+
+    def __init__(self, root, cypher, logger=None, pack_limit=64 * 1024 * 1024, gc_threshold=0.3):
+        self.root = root
+        self.cypher = cypher
+        self.logger = logger
+        self.pack_limit = pack_limit
+        # Paczkę przepisujemy dopiero, gdy martwe dane to co najmniej taki jej ułamek
+        self.gc_threshold = gc_threshold
+        self.chunker = ContentChunker()
+        self.vault_id = None
+        self.enc_key = None
+        self.id_key = None
+        self.index = None
+        # Zapis, odczyt z paczek i GC nie mogą się przeplatać (GC usuwa niepodpięte fragmenty)
+        self.lock = threading.RLock()
+
+    @classmethod
+    def is_vault(cls, root):
+        return os.path.isfile(os.path.join(root, cls.CONFIG_NAME))
+
+    def _path(self, *parts):
+        return os.path.join(self.root, *parts)
+
+    def _log(self, message, level="INFO"):
+        if self.logger:
+            self.logger.log(message, level=level)
+
+    # --- Klucze i szyfrowanie ---
+
+    def _unlock_keys(self, token, salt):
+        master = self.cypher._derive_key(token, salt)
+        self.enc_key = hmac.new(master, b"unlockend-vault-enc", hashlib.sha256).digest()
+        self.id_key = hmac.new(master, b"unlockend-vault-id", hashlib.sha256).digest()
+
+    def _seal(self, data, aad):
+        nonce = os.urandom(12)
+        return nonce + AESGCM(self.enc_key).encrypt(nonce, data, aad)
+
+    def _unseal(self, blob, aad):
+        return AESGCM(self.enc_key).decrypt(blob[:12], blob[12:], aad)
+
+    def chunk_id(self, data):
+        """Keyed chunk ID - equal chunks dedupe, but IDs reveal nothing without the vault key."""
+        return hmac.new(self.id_key, data, hashlib.sha256).hexdigest()
+
+    # --- Cykl życia sejfu ---
+
+    def create(self):
+        """Initialises an empty vault and returns its newly generated token."""
+        if self.is_vault(self.root):
+            raise ValueError("Vault already exists in this folder.")
+        os.makedirs(self._path(self.PACK_DIR), exist_ok=True)
+        token = get_token(12)
+        vault_id = uuid.uuid4().bytes
+        salt = os.urandom(self.cypher.salt_size)
+        with open(self._path(self.CONFIG_NAME), "wb") as f:
+            f.write(struct.pack(self.CONFIG_FORMAT, self.MAGIC, self.VERSION, vault_id, salt))
+
+        self.vault_id = vault_id
+        self._unlock_keys(token, salt)
+        self.index = {"chunks": {}, "recipes": {}}
+        self._save_index()
+        self._log(f"Vault created: {self.root}")
+        return token
+
+    def open(self, token):
+        with open(self._path(self.CONFIG_NAME), "rb") as f:
+            raw = f.read(struct.calcsize(self.CONFIG_FORMAT))
+        magic, _ver, vault_id, salt = struct.unpack(self.CONFIG_FORMAT, raw)
+        if magic != self.MAGIC:
+            raise ValueError("Not an UnlockEND vault!")
+
+        self.vault_id = vault_id
+        self._unlock_keys(token, salt)
+        try:
+            with open(self._path(self.INDEX_NAME), "rb") as f:
+                self.index = json.loads(self._unseal(f.read(), b"index" + vault_id))
+        except InvalidTag:
+            self.enc_key = self.id_key = None
+            raise ValueError("WRONG VAULT TOKEN!")
+        self._log(f"Vault opened: {self.root} ({len(self.index['chunks'])} chunks)")
+
+    def _save_index(self):
+        with self.lock:
+            tmp_path = self._path(self.INDEX_NAME + ".tmp_atomic")
+            payload = json.dumps(self.index, separators=(",", ":")).encode()
+            with open(tmp_path, "wb") as f:
+                f.write(self._seal(payload, b"index" + self.vault_id))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self._path(self.INDEX_NAME))
+
+    # --- Paczki ---
+
+    def _pack_names(self):
+        return sorted(n for n in os.listdir(self._path(self.PACK_DIR)) if n.endswith(".pak"))
+
+    def _next_pack_name(self):
+        names = self._pack_names()
+        last = int(names[-1][5:-4]) if names else 0
+        return f"pack-{last + 1:06d}.pak"
+
+    def _open_pack_for_append(self):
+        names = self._pack_names()
+        if names and os.path.getsize(self._path(self.PACK_DIR, names[-1])) < self.pack_limit:
+            name = names[-1]
+        else:
+            name = self._next_pack_name()
+        return name, open(self._path(self.PACK_DIR, name), "ab")
+
+    # --- Zapis i odczyt elementów ---
+
+    def store_file(self, path, name, is_dir, progress_sig=None):
+        """Chunks and stores a file; only chunks unknown to the index are encrypted and written."""
+        with self.lock:
+            chunks = self.index["chunks"]
+            file_size = os.path.getsize(path) or 1
+            recipe_chunks = []
+            processed = 0
+            new_bytes = 0
+
+            pack_name, pack = self._open_pack_for_append()
+            try:
+                with open(path, "rb") as f_in:
+                    for chunk in self.chunker.iter_chunks(f_in):
+                        cid = self.chunk_id(chunk)
+                        recipe_chunks.append(cid)
+                        if cid not in chunks:
+                            if pack.tell() >= self.pack_limit:
+                                pack.close()
+                                pack_name = self._next_pack_name()
+                                pack = open(self._path(self.PACK_DIR, pack_name), "ab")
+                            blob = self._seal(chunk, cid.encode())
+                            chunks[cid] = [pack_name, pack.tell(), len(blob)]
+                            pack.write(blob)
+                            new_bytes += len(chunk)
+                        processed += len(chunk)
+                        if progress_sig:
+                            progress_sig.emit(int((processed / file_size) * 95))
+                pack.flush()
+                os.fsync(pack.fileno())
+            finally:
+                pack.close()
+
+            recipe = {
+                "id": uuid.uuid4().hex,
+                "name": name,
+                "is_dir": is_dir,
+                "size": processed,
+                "chunks": recipe_chunks,
+            }
+            self.index["recipes"][recipe["id"]] = sorted(set(recipe_chunks))
+            self._save_index()
+            self._log(f"Vault stored {processed} bytes, {new_bytes} new after dedup.")
+            return recipe
+
+    def write_recipe(self, recipe, recipe_path):
+        payload = json.dumps(recipe, separators=(",", ":")).encode()
+        header = struct.pack(self.RECIPE_HEADER, self.RECIPE_MAGIC, self.VERSION, self.vault_id)
+        with open(recipe_path, "wb") as f:
+            f.write(header + self._seal(payload, header))
+
+    def read_recipe(self, recipe_path):
+        header_size = struct.calcsize(self.RECIPE_HEADER)
+        with open(recipe_path, "rb") as f:
+            raw = f.read()
+        magic, _ver, vault_id = struct.unpack(self.RECIPE_HEADER, raw[:header_size])
+        if magic != self.RECIPE_MAGIC:
+            raise ValueError("Not an UnlockEND vault recipe!")
+        if vault_id != self.vault_id:
+            raise ValueError("Recipe belongs to a different vault.")
+        try:
+            return json.loads(self._unseal(raw[header_size:], raw[:header_size]))
+        except InvalidTag:
+            raise ValueError("Recipe corrupted or tampered with.")
+
+    def restore(self, recipe, out_path, progress_sig=None):
+        with self.lock:
+            chunks = self.index["chunks"]
+            total = recipe["size"] or 1
+            processed = 0
+            packs = {}
+            try:
+                with open(out_path, "wb") as f_out:
+                    for cid in recipe["chunks"]:
+                        if cid not in chunks:
+                            raise ValueError(f"Vault is missing chunk {cid[:12]}...")
+                        pack_name, offset, length = chunks[cid]
+                        if pack_name not in packs:
+                            packs[pack_name] = open(self._path(self.PACK_DIR, pack_name), "rb")
+                        pack = packs[pack_name]
+                        pack.seek(offset)
+                        data = self._unseal(pack.read(length), cid.encode())
+                        f_out.write(data)
+                        processed += len(data)
+                        if progress_sig:
+                            progress_sig.emit(int((processed / total) * 95))
+            finally:
+                for pack in packs.values():
+                    pack.close()
+
+    def forget(self, recipe_id):
+        """Drops a recipe's chunk references; the chunks themselves go on the next gc()."""
+        with self.lock:
+            if self.index["recipes"].pop(recipe_id, None) is not None:
+                self._save_index()
+
+    def gc(self):
+        """Compacts packs whose dead fraction reaches gc_threshold. Returns (chunks_removed, bytes_reclaimed).
+
+        Dead chunks in other packs stay indexed (they can still dedupe) until a later gc() compacts them.
+        """
+        with self.lock:
+            chunks = self.index["chunks"]
+            live = set()
+            for ids in self.index["recipes"].values():
+                live.update(ids)
+
+            live_bytes = {}
+            for cid, (pack_name, _offset, length) in chunks.items():
+                if cid in live:
+                    live_bytes[pack_name] = live_bytes.get(pack_name, 0) + length
+
+            # Zapis ma rosnąć ze zmianą danych - pojedynczy martwy fragment nie przepisuje całej paczki
+            dirty_packs = set()
+            for name in self._pack_names():
+                size = os.path.getsize(self._path(self.PACK_DIR, name))
+                if not size or 1 - live_bytes.get(name, 0) / size >= self.gc_threshold:
+                    dirty_packs.add(name)
+
+            dead = [cid for cid, loc in chunks.items() if cid not in live and loc[0] in dirty_packs]
+            for cid in dead:
+                del chunks[cid]
+
+            old_packs = sorted(dirty_packs)
+            reclaimed = sum(os.path.getsize(self._path(self.PACK_DIR, n)) for n in old_packs)
+
+            # Żywe fragmenty z brudnych paczek kopiujemy (bez ponownego szyfrowania) do nowej paczki
+            movers = sorted((loc[0], loc[1], cid) for cid, loc in chunks.items() if loc[0] in dirty_packs)
+            if movers:
+                new_name = self._next_pack_name()
+                with open(self._path(self.PACK_DIR, new_name), "wb") as f_new:
+                    src_name, src = None, None
+                    try:
+                        for pack_name, offset, cid in movers:
+                            if pack_name != src_name:
+                                if src: src.close()
+                                src_name, src = pack_name, open(self._path(self.PACK_DIR, pack_name), "rb")
+                            length = chunks[cid][2]
+                            src.seek(offset)
+                            chunks[cid] = [new_name, f_new.tell(), length]
+                            f_new.write(src.read(length))
+                    finally:
+                        if src: src.close()
+                    f_new.flush()
+                    os.fsync(f_new.fileno())
+                reclaimed -= os.path.getsize(self._path(self.PACK_DIR, new_name))
+
+            # Najpierw trwały indeks, dopiero potem usuwanie starych paczek
+            self._save_index()
+            for name in old_packs:
+                os.remove(self._path(self.PACK_DIR, name))
+
+            self._log(f"Vault GC: removed {len(dead)} chunks, reclaimed {reclaimed} bytes.")
+            return len(dead), reclaimed
@@ -13,7 +13,20 @@ except Exception:
     traceback.print_exc()
     sys.exit(1)
 
+def run_daemon():
+    """Headless mode: serve lock/unlock requests over the local socket only."""
+    from core.daemon import EngineDaemon
+    console_logger = ConsoleLogic()
+    daemon = EngineDaemon(UnlockAppEngine(logger=console_logger))
+    if not daemon.run():
+        # Echo konsoli jest asynchroniczne - przyczynę wypisujemy wprost przy wyjściu
+        sys.exit(f"Daemon error: {daemon.error}")
+
 def main():
+    if "--daemon" in sys.argv:
+        run_daemon()
+        return
+
     app = QApplication(sys.argv)
     app.setApplicationName("UnlockEND")
     
@@ -23,6 +36,11 @@ def main():
     try:
         console_logger = ConsoleLogic()
         engine = UnlockAppEngine(logger=console_logger)
+
+        # --serve: usługa na gnieździe działa obok aplikacji w trayu (osobny silnik)
+        if "--serve" in sys.argv:
+            from core.daemon import EngineDaemon
+            EngineDaemon(UnlockAppEngine(logger=console_logger)).start_in_thread()
         
         print("Inicjalizacja okna...")
         window = MainWindow(engine, console_logger)
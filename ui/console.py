@@ -4,8 +4,9 @@ from PyQt6.QtCore import Qt, pyqtSignal
 class DebugConsoleWidget(QWidget):
     command_submitted = pyqtSignal(str)
 
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, max_blocks=5000):
         super().__init__(parent)
+        self.max_blocks = max_blocks
         self.init_ui()
 
     def init_ui(self):
@@ -23,6 +24,8 @@ class DebugConsoleWidget(QWidget):
         
         self.text_area = QTextEdit()
         self.text_area.setReadOnly(True)
+        # Najstarsze linie są usuwane automatycznie po przekroczeniu limitu
+        self.text_area.document().setMaximumBlockCount(self.max_blocks)
         self.text_area.setStyleSheet("""
             background: #050505; 
             color: #00ff00; 
@@ -53,7 +56,14 @@ class DebugConsoleWidget(QWidget):
             self.input_line.clear()
 
     def append_log(self, message):
-        self.text_area.append(message)
+        self.append_batch([message])
+
+    def append_batch(self, messages):
+        """Appends many lines with a single repaint and scrollbar update."""
+        self.text_area.setUpdatesEnabled(False)
+        for message in messages:
+            self.text_area.append(message)
+        self.text_area.setUpdatesEnabled(True)
         # Auto-scroll to bottom
         self.text_area.verticalScrollBar().setValue(
             self.text_area.verticalScrollBar().maximum()
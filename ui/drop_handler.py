@@ -17,7 +17,7 @@ class DropHandler:
             self.window.status_label.setText(f"Selected: {os.path.basename(path)}")
             self.window.pending_path = path
             
-            if path.endswith(".end"):
+            if path.endswith(".end") or path.endswith(".vend"):
                 self.window.handle_unlock(path)
             else:
                 self.window.handle_lock(path)
@@ -32,9 +32,17 @@ class AppMenu(QMenuBar):
         self.toggle_custom_encoding.setChecked(True)
         
         self.rotate_key = QAction("Force Key Rotation", self)
+
+        self.toggle_vault_mode = QAction("Vault Mode (Deduplication)", self)
+        self.toggle_vault_mode.setCheckable(True)
+
+        self.vault_gc = QAction("Vault Garbage Collection", self)
         
         self.crypto_menu.addAction(self.toggle_custom_encoding)
         self.crypto_menu.addAction(self.rotate_key)
+        self.crypto_menu.addSeparator()
+        self.crypto_menu.addAction(self.toggle_vault_mode)
+        self.crypto_menu.addAction(self.vault_gc)
 
         # --- Help Menu ---
         help_menu = self.addMenu("&Help")
@@ -50,6 +58,7 @@ class AppMenu(QMenuBar):
 
         # Encryption Actions
         self.rotate_key.triggered.connect(parent.force_key_rotation)
+        self.vault_gc.triggered.connect(parent.vault_gc_action)
 
         # Help Actions
         self.about_action.triggered.connect(parent.show_about_dialog)
\ No newline at end of file
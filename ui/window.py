@@ -2,12 +2,13 @@ import os
 from PyQt6.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QPushButton, 
                              QLabel, QFileDialog, QMessageBox, QInputDialog, 
                              QLineEdit, QSystemTrayIcon, QMenu, QProgressDialog)
-from PyQt6.QtCore import Qt
+from PyQt6.QtCore import Qt, QTimer
 from PyQt6.QtGui import QShortcut, QKeySequence, QGuiApplication, QIcon
 from ui.menu import AppMenu
 from ui.console import DebugConsoleWidget
 from ui.drop_handler import DropHandler
 from core.engine import UnlockWorker
+from core.vault import Vault
 
 class MainWindow(QMainWindow):
     def __init__(self, engine, logger):
@@ -17,6 +18,8 @@ class MainWindow(QMainWindow):
         self.logger = logger
         self.current_token = ""
         self.tray_icon = None
+        self.vault = None
+        self.worker = None
         
         self.init_ui()
         self.init_tray()
@@ -24,7 +27,11 @@ class MainWindow(QMainWindow):
         self.setAcceptDrops(True)
         self.drop_handler = DropHandler(self)
         
-        self.logger.set_callback(self.console_widget.append_log)
+        self.logger.set_callback(self.console_widget.append_batch)
+        # Logi z wątków roboczych trafiają do konsoli paczkami, nie po jednej linii
+        self.log_timer = QTimer(self)
+        self.log_timer.timeout.connect(self.logger.flush)
+        self.log_timer.start(100)
         self.console_widget.command_submitted.connect(self.handle_console_command)
         
         self.console_shortcut = QShortcut(QKeySequence("F12"), self)
@@ -100,19 +107,36 @@ class MainWindow(QMainWindow):
         self.tray_icon.show()
         self.tray_icon.activated.connect(self.on_tray_icon_activated)
 
-    def start_operation_worker(self, mode, path, token=None):
+    def start_operation_worker(self, mode, path, token=None, vault=None):
         self.progress_dialog = QProgressDialog("Initializing...", "Cancel", 0, 100, self)
         self.progress_dialog.setWindowModality(Qt.WindowModality.WindowModal)
         self.progress_dialog.setWindowTitle("UnlockEND Task")
         self.progress_dialog.show()
 
-        self.worker = UnlockWorker(self.engine, mode, path, token)
+        self.worker = UnlockWorker(self.engine, mode, path, token, vault=vault)
         self.worker.status_sig.connect(self.progress_dialog.setLabelText)
         self.worker.progress_sig.connect(self.progress_dialog.setValue)
         self.worker.finished_sig.connect(self.on_operation_finished)
         self.worker.finished_sig.connect(self.progress_dialog.close)
+        if mode.startswith('vault'):
+            # Akcje sejfu zablokowane, dopóki wątek sejfu pracuje (Cancel tylko zamyka okno)
+            self.set_vault_actions_enabled(False)
+            self.worker.finished_sig.connect(lambda *_: self.set_vault_actions_enabled(True))
         self.worker.start()
 
+    def vault_worker_running(self):
+        return bool(self.worker and self.worker.isRunning() and self.worker.mode.startswith('vault'))
+
+    def set_vault_actions_enabled(self, enabled):
+        self.menu_bar.toggle_vault_mode.setEnabled(enabled)
+        self.menu_bar.vault_gc.setEnabled(enabled)
+
+    def vault_busy_warning(self):
+        if self.vault_worker_running():
+            QMessageBox.warning(self, "Vault", "Vault operation in progress. Please wait.")
+            return True
+        return False
+
     def update_attempts_display(self, path):
         """Pomocnicza funkcja do aktualizacji UI o stan licznika prób."""
         if path and path.endswith('.end'):
@@ -125,7 +149,13 @@ class MainWindow(QMainWindow):
 
     def on_operation_finished(self, success, result):
         if success:
-            if len(result) == 12:
+            if result.startswith("Vault GC:"):
+                self.status_label.setText(result)
+                self.status_label.setStyleSheet("color: white;")
+            elif result.endswith(".vend"):
+                self.status_label.setText("Stored in vault.")
+                self.status_label.setStyleSheet("color: #00ff00;")
+            elif len(result) == 12:
                 self.current_token = result
                 masked = f"{result[:2]}********{result[-2:]}"
                 self.token_display.setText(f"TOKEN: {masked}")
@@ -164,11 +194,20 @@ class MainWindow(QMainWindow):
                 path = QFileDialog.getExistingDirectory(self, "Select Folder")
         
         if path:
-            self.start_operation_worker('lock', path)
+            if self.menu_bar.toggle_vault_mode.isChecked():
+                if not self.vault_busy_warning() and self.ensure_vault():
+                    self.start_operation_worker('vault_lock', path, vault=self.vault)
+            else:
+                self.start_operation_worker('lock', path)
 
     def handle_unlock(self, path=None):
         if not path:
-            path, _ = QFileDialog.getOpenFileName(self, "Select .end File", "", "UnlockEND (*.end)")
+            path, _ = QFileDialog.getOpenFileName(self, "Select .end File", "", "UnlockEND (*.end *.vend)")
+
+        if path and path.endswith(".vend"):
+            if not self.vault_busy_warning() and self.ensure_vault():
+                self.start_operation_worker('vault_unlock', path, vault=self.vault)
+            return
             
         if path:
             # Odświeżamy info o próbach przed wpisaniem tokena
@@ -212,6 +251,9 @@ class MainWindow(QMainWindow):
         if cmd_clean == "show" and self.current_token: self.logger.log(f"TOKEN: {self.current_token}")
         elif cmd_clean == "clear": self.console_widget.text_area.clear()
         elif cmd_clean == "quit": self.quit_application()
+        elif cmd_clean.startswith("level "):
+            try: self.logger.set_level(cmd_clean.split(None, 1)[1])
+            except ValueError as e: self.logger.log_warning(str(e))
 
     def toggle_console(self):
         state = not self.console_widget.isVisible()
@@ -234,6 +276,43 @@ class MainWindow(QMainWindow):
                           "Secure file and folder encryption system.\n"
                           "Optimized for CachyOS.")
 
+    def ensure_vault(self):
+        """Opens (or creates) the vault used by vault mode for this session."""
+        if self.vault:
+            return True
+        root = QFileDialog.getExistingDirectory(self, "Select Vault Folder")
+        if not root:
+            return False
+
+        try:
+            vault = Vault(root, self.engine.cypher, self.logger)
+        except RuntimeError as e:
+            QMessageBox.critical(self, "Vault", str(e))
+            return False
+        if not Vault.is_vault(root):
+            token = vault.create()
+            self.current_token = token
+            masked = f"{token[:2]}********{token[-2:]}"
+            self.token_display.setText(f"VAULT TOKEN: {masked}")
+            self.copy_btn.setEnabled(True)
+            QMessageBox.information(self, "Vault", "New vault created. Copy and keep its token safe!")
+        else:
+            token, ok = QInputDialog.getText(self, "Vault Token", "Enter Vault Code:", QLineEdit.EchoMode.Password)
+            if not (ok and token):
+                return False
+            try:
+                vault.open(token)
+            except ValueError as e:
+                QMessageBox.critical(self, "Vault", str(e))
+                return False
+        self.vault = vault
+        return True
+
+    def vault_gc_action(self):
+        if self.vault_busy_warning() or not self.ensure_vault():
+            return
+        self.start_operation_worker('vault_gc', self.vault.root, vault=self.vault)
+
     def force_key_rotation(self):
         if not self.current_token:
             QMessageBox.warning(self, "Rotation", "No active token found!")